@@ -0,0 +1,297 @@
+"""
+tests/anki/test_cnsf_to_import_tsv.py
+
+Unit tests for tools/anki/export/cnsf_to_import_tsv.py.
+
+MultiMarkdown is not required: the renderer is monkeypatched with a fake that
+derives HTML from the note's front/back markdown.
+"""
+from __future__ import annotations
+
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from tools.anki.cnsf_parse import load_cnsf_note  # noqa: E402
+from tools.anki.export import cnsf_to_import_tsv as mod  # noqa: E402
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixtures / helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _write_note(
+    dir_: Path, note_id: str, front: str = "Q?", back: str = "A.", model: str = "B737_Structured"
+) -> Path:
+    p = dir_ / f"{note_id}.md"
+    p.write_text(
+        "---\n"
+        "schema: cnsf/v0\n"
+        "domain: b737\n"
+        f"note_id: {note_id}\n"
+        "anki:\n"
+        f"  model: {model}\n"
+        "  deck: B737::Test\n"
+        "tags:\n"
+        "- status:verified\n"
+        "fields:\n"
+        "  Source Document: Test Doc\n"
+        "---\n\n"
+        f"# front_md\n\n{front}\n\n# back_md\n\n{back}\n",
+        encoding="utf-8",
+    )
+    return p
+
+
+def _fake_render(note_path):
+    note = load_cnsf_note(str(note_path))
+    return {
+        "front_html": f"<p>{note.front_md.strip()}</p>",
+        "back_html": f"<p>{note.back_md.strip()}</p>",
+        "front_provenance": "<!-- fake -->",
+        "back_provenance": "<!-- fake -->",
+    }
+
+
+@pytest.fixture
+def fake_renderer(monkeypatch):
+    calls: list[str] = []
+
+    def _render(note_path):
+        calls.append(str(note_path))
+        return _fake_render(note_path)
+
+    monkeypatch.setattr(mod, "render_cnsf_note_to_html", _render)
+    return calls
+
+
+def _read_rows(path: Path) -> list[dict[str, str]]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f, delimiter="\t"))
+
+
+def _export(tmp_path: Path, notes_dir: Path, **kwargs) -> list[dict[str, str]]:
+    envs = [mod.load_envelope(p, None) for p in mod.expand_inputs([str(notes_dir)])]
+    envs.sort(key=lambda x: x.note_id)
+    out = tmp_path / "out.tsv"
+    mod.write_tsv(out, envs, mod._stable_extra_field_names(envs), True, **kwargs)
+    return _read_rows(out)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# _split_tags
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestSplitTags:
+    @pytest.mark.parametrize(
+        "tags, expected",
+        [
+            (None, []),
+            ("", []),
+            ("a b\tc\n", ["a", "b", "c"]),
+            ("a, b,,c ,", ["a", "b", "c"]),
+            ([" a ", "", 3], ["a", "3"]),
+            (7, ["7"]),
+        ],
+    )
+    def test_forms(self, tags, expected):
+        assert mod._split_tags(tags) == expected
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# expand_inputs
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestExpandInputs:
+    def test_directory_walk_sorted_skips_underscore_and_dedupes(self, tmp_path):
+        root = tmp_path / "notes"
+        (root / "b").mkdir(parents=True)
+        (root / "a").mkdir()
+        for rel in ("b/z.md", "b/_template.md", "a/y.md", "x.md", "a/notes.txt"):
+            (root / rel).write_text("", encoding="utf-8")
+        (tmp_path / "link.md").symlink_to(root / "x.md")
+
+        got = mod.expand_inputs([str(root), str(root / "a" / "y.md"), str(tmp_path / "link.md")])
+
+        assert got == [root / "a" / "y.md", root / "b" / "z.md", root / "x.md"]
+
+    def test_glob_pattern_and_missing_literal(self, tmp_path):
+        root = tmp_path / "notes"
+        (root / "sub").mkdir(parents=True)
+        (root / "sub" / "n1.md").write_text("", encoding="utf-8")
+        (root / "sub" / "_skip.md").write_text("", encoding="utf-8")
+
+        assert mod.expand_inputs([str(root / "**" / "*.md")]) == [root / "sub" / "n1.md"]
+        assert mod.expand_inputs([str(root / "missing.md")]) == []
+
+    def test_bracketed_literal_file(self, tmp_path):
+        note = tmp_path / "note[1].md"
+        note.write_text("", encoding="utf-8")
+
+        assert mod.expand_inputs([str(note)]) == [note]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# write_tsv
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestWriteTsv:
+    @pytest.mark.parametrize("jobs", [1, 4])
+    def test_rows_follow_note_order_for_any_job_count(self, tmp_path, fake_renderer, jobs):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        for i in range(12):
+            _write_note(notes_dir, f"t-{i:03d}", front=f"front {i}", back=f"back {i}")
+
+        rows = _export(tmp_path, notes_dir, jobs=jobs)
+
+        assert [r["NoteID"] for r in rows] == [f"t-{i:03d}" for i in range(12)]
+        assert [r["Front"] for r in rows] == [f"<p>front {i}</p>" for i in range(12)]
+        assert rows[0]["model"] == "B737_Structured"
+        assert rows[0]["deck"] == "B737::Test"
+        assert rows[0]["Source Document"] == "Test Doc"
+
+    def test_mixed_models_share_union_header_with_blank_cells(self, tmp_path, fake_renderer):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        _write_note(notes_dir, "a-checklist", model="B737_Checklist")
+        _write_note(notes_dir, "b-structured", model="B737_Structured")
+
+        out = tmp_path / "out.tsv"
+        envs = sorted(
+            (mod.load_envelope(p, None) for p in mod.expand_inputs([str(notes_dir)])),
+            key=lambda x: x.note_id,
+        )
+        mod.write_tsv(out, envs, [], True)
+
+        header = out.read_text(encoding="utf-8").splitlines()[0].split("\t")
+        assert header[:2] == ["model", "deck"]
+        assert "ChecklistName" in header and "Source Location" in header
+        rows = _read_rows(out)
+        assert rows[0]["Source Location"] == ""
+        assert rows[1]["ChecklistName"] == ""
+        assert rows[1]["Source Document"] == "Test Doc"
+
+    def test_refuses_overwrite_without_flag(self, tmp_path, fake_renderer):
+        out = tmp_path / "out.tsv"
+        out.write_text("", encoding="utf-8")
+        with pytest.raises(FileExistsError):
+            mod.write_tsv(out, [], [], False)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Render cache
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestRenderCache:
+    def test_warm_cache_skips_renderer(self, tmp_path, fake_renderer):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        _write_note(notes_dir, "t-001", back="A.")
+        _write_note(notes_dir, "t-002", back="B.")
+        cache_dir = tmp_path / "cache"
+
+        cold = _export(tmp_path, notes_dir, cache_dir=cache_dir)
+        assert len(fake_renderer) == 2
+        assert len(list(cache_dir.glob("*/*.json"))) == 2
+
+        warm = _export(tmp_path, notes_dir, cache_dir=cache_dir)
+        assert len(fake_renderer) == 2
+        assert warm == cold
+
+    def test_edited_source_is_re_rendered(self, tmp_path, fake_renderer):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        p = _write_note(notes_dir, "t-001", back="old")
+        cache_dir = tmp_path / "cache"
+
+        _export(tmp_path, notes_dir, cache_dir=cache_dir)
+        _write_note(notes_dir, "t-001", back="new")
+        rows = _export(tmp_path, notes_dir, cache_dir=cache_dir)
+
+        assert fake_renderer == [str(p), str(p)]
+        assert rows[0]["Back"] == "<p>new</p>"
+
+    @pytest.mark.parametrize("jobs", [1, 4])
+    def test_identical_front_back_render_once_per_run(self, tmp_path, fake_renderer, jobs):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        for note_id in ("t-001", "t-002", "t-003"):
+            _write_note(notes_dir, note_id, back="same")
+        _write_note(notes_dir, "t-004", back="other")
+
+        rows = _export(tmp_path, notes_dir, jobs=jobs)
+
+        assert len(fake_renderer) == 2
+        assert [r["Back"] for r in rows] == ["<p>same</p>"] * 3 + ["<p>other</p>"]
+
+    def test_metadata_edit_keeps_cache_entry(self, tmp_path, fake_renderer):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        note = _write_note(notes_dir, "t-001")
+        cache = tmp_path / "cache"
+
+        _export(tmp_path, notes_dir, cache_dir=cache)
+        note.write_text(note.read_text(encoding="utf-8").replace("B737::Test", "B737::Other"), encoding="utf-8")
+        rows = _export(tmp_path, notes_dir, cache_dir=cache)
+
+        assert len(fake_renderer) == 1
+        assert rows[0]["deck"] == "B737::Other"
+
+    def test_no_cache_dir_always_renders(self, tmp_path, fake_renderer):
+        notes_dir = tmp_path / "notes"
+        notes_dir.mkdir()
+        _write_note(notes_dir, "t-001")
+
+        _export(tmp_path, notes_dir)
+        _export(tmp_path, notes_dir)
+
+        assert len(fake_renderer) == 2
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# _tsv_safe
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestTsvSafe:
+    @pytest.mark.parametrize(
+        "raw, expected",
+        [
+            ("plain", "plain"),
+            ("a\tb", "a\\tb"),
+            ("a\nb", "a\\nb"),
+            ("a\r\nb", "a\\nb"),
+            ("a\rb", "a\\nb"),
+            ("a\r\n\r\nb\t", "a\\n\\nb\\t"),
+            ("", ""),
+        ],
+    )
+    def test_escapes_to_one_physical_line(self, raw, expected):
+        assert mod._tsv_safe(raw) == expected
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# main
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestMain:
+    def test_negative_jobs_rejected_by_argparse(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(
+            sys, "argv", ["cnsf_to_import_tsv", "--in", str(tmp_path), "--out", str(tmp_path / "o.tsv"), "--jobs", "-1"]
+        )
+        with pytest.raises(SystemExit) as exc:
+            mod.main()
+        assert exc.value.code == 2
+        assert "--jobs" in capsys.readouterr().err
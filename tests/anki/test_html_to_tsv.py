@@ -0,0 +1,133 @@
+"""
+tests/anki/test_html_to_tsv.py
+
+Unit tests for the canonical-HTML extractors:
+  - tools/anki/html_after_to_tsv.py     (AFTER sections)
+  - tools/anki/html_frontback_to_tsv.py  (AFTER_FRONT / AFTER_BACK sections)
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+import pytest  # noqa: E402
+
+from tools.anki import html_after_to_tsv, html_frontback_to_tsv  # noqa: E402
+
+
+CANONICAL_AFTER_HTML = b"""<p>preamble</p><h3>AFTER</h3><p>orphan</p>
+<h2 id="a">a&amp;b</h2><p>q</p><h3 id="after">AFTER</h3>
+<p>one</p><p>two</p><hr />
+<p>tail</p><h3>AFTER</h3><p>second marker ignored</p>
+<h2 id="b">b</h2><h3>Other</h3><p>no AFTER here</p>
+<h2 id="c">c</h2><H3 id="after"> after </H3><p>c body</p>
+<h2 id="d">d</h2><h3>AFTER</h3>
+<h2 id="e">e</h2><h3>AFTER</h3><p>end</p>"""
+
+
+class TestFindNotes:
+    def test_first_after_per_section_up_to_hr_or_next_h2(self):
+        assert list(html_after_to_tsv.find_notes(CANONICAL_AFTER_HTML)) == [
+            ("a&b", "<p>one</p><p>two</p>"),
+            ("c", "<p>c body</p>"),
+            ("e", "<p>end</p>"),
+        ]
+
+    def test_heading_markup_and_entities_are_flattened(self):
+        doc = b'<h2 id="x"><code>sys&#x2d;elec</code>\n  &apos;01&apos;</h2><h3><em>AFTER</em></h3><p>x</p>'
+        assert list(html_after_to_tsv.find_notes(doc)) == [("sys-elec '01'", "<p>x</p>")]
+
+    def test_no_headings(self):
+        assert list(html_after_to_tsv.find_notes(b"<p>nothing</p>")) == []
+
+
+class TestExtractFrontBack:
+    @pytest.mark.parametrize(
+        "section, expected",
+        [
+            (
+                b"<h3>AFTER_FRONT</h3><p>F \xc3\xbc</p><h3>AFTER_BACK</h3><p>B</p><hr /><p>tail</p>",
+                ("<p>F \u00fc</p>", "<p>B</p>"),
+            ),
+            (b"<p>intro</p><h3>AFTER_BACK</h3>\n<p>B</p>\n", ("<p>intro</p>", "<p>B</p>")),
+            (b"<h3>AFTER_FRONT</h3><p>F</p><hr/><p>x</p>", ("<p>F</p><hr/><p>x</p>", "")),
+            (b"<p>no markers</p>", ("", "")),
+            (b"<h3>AFTER_FRONT</h3><h3>AFTER_BACK</h3><hr>", ("", "")),
+            (b"<h3>AFTER_FRONT</h3>F<h3>AFTER_BACK</h3>B1<h3>AFTER_BACK</h3>B2", ("F", "B1<h3>AFTER_BACK</h3>B2")),
+        ],
+    )
+    def test_sections(self, section, expected):
+        assert html_frontback_to_tsv.extract_front_back(section) == expected
+
+    def test_map_html_empty_file(self, tmp_path):
+        p = tmp_path / "empty.html"
+        p.write_bytes(b"")
+        with html_frontback_to_tsv.map_html(p) as data:
+            assert data == b""
+
+
+class TestIterSections:
+    def test_sections_split_on_h2_with_id_only(self):
+        doc = (
+            b'<p>pre</p><h2 class="x" id="n-1">n-1</h2><p>a</p>'
+            b"<h2>no id</h2><p>still n-1</p>"
+            b'<h2 id="n-2">n-2</h2><p>b</p>'
+        )
+        assert list(html_frontback_to_tsv.iter_sections(doc)) == [
+            ("n-1", b"<p>a</p><h2>no id</h2><p>still n-1</p>"),
+            ("n-2", b"<p>b</p>"),
+        ]
+
+
+class TestMain:
+    def test_after_bad_utf8_leaves_existing_output(self, tmp_path, monkeypatch):
+        inp = tmp_path / "in.html"
+        inp.write_bytes(b'<h2 id="a">a</h2><h3>AFTER</h3><p>ok</p><h2 id="b">b</h2><h3>AFTER</h3><p>\xff</p>')
+        out = tmp_path / "out.tsv"
+        out.write_text("previous\n", encoding="utf-8")
+        monkeypatch.setattr(sys, "argv", ["html_after_to_tsv.py", "--in", str(inp), "--out", str(out)])
+
+        with pytest.raises(UnicodeDecodeError):
+            html_after_to_tsv.main()
+
+        assert out.read_text(encoding="utf-8") == "previous\n"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["in.html", "out.tsv"]
+
+    def test_frontback_failure_leaves_existing_output(self, tmp_path, monkeypatch):
+        inp = tmp_path / "in.html"
+        inp.write_bytes(b'<h2 id="a">a</h2><p>one</p><h2 id="b">b</h2><p>two</p>')
+        out = tmp_path / "out.tsv"
+        out.write_text("previous\n", encoding="utf-8")
+        calls = []
+
+        def _extract(body):
+            calls.append(body)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+            return "", ""
+
+        monkeypatch.setattr(html_frontback_to_tsv, "extract_front_back", _extract)
+        monkeypatch.setattr(sys, "argv", ["html_frontback_to_tsv.py", "--in", str(inp), "--out", str(out)])
+
+        with pytest.raises(RuntimeError):
+            html_frontback_to_tsv.main()
+
+        assert out.read_text(encoding="utf-8") == "previous\n"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["in.html", "out.tsv"]
+
+    def test_frontback_success_replaces_output(self, tmp_path, monkeypatch):
+        inp = tmp_path / "in.html"
+        inp.write_bytes(b'<h2 id="a">a</h2><h3>AFTER_FRONT</h3><p>F</p><h3>AFTER_BACK</h3><p>B</p>')
+        out = tmp_path / "out.tsv"
+        out.write_text("previous\n", encoding="utf-8")
+        monkeypatch.setattr(sys, "argv", ["html_frontback_to_tsv.py", "--in", str(inp), "--out", str(out)])
+
+        html_frontback_to_tsv.main()
+
+        lines = out.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == "\t".join(html_frontback_to_tsv.HEADER)
+        assert lines[1] == "a\t\t<p>F</p>\t<p>B</p>\t<p>B</p>"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["in.html", "out.tsv"]
@@ -0,0 +1,215 @@
+"""
+tests/anki/test_update_notes_from_tsv.py
+
+Unit tests for tools/anki/update_notes_from_tsv.py.
+
+AnkiConnect is replaced by FakeAnki, which serves findNotes / notesInfo /
+updateNoteFields (directly or inside "multi") from an in-memory note table
+and records every HTTP-level request.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from tools.anki import update_notes_from_tsv as mod  # noqa: E402
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixtures / helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class FakeAnki:
+    def __init__(self, notes: dict[int, dict[str, str]]):
+        self.notes = notes
+        self.requests: list[str] = []
+
+    def _find(self, query: str) -> list[int]:
+        hits: set[int] = set()
+        for term in query.split(" OR "):
+            field, _, value = term.partition(":")
+            value = value.strip('"').casefold()
+            hits.update(nid for nid, f in self.notes.items() if f.get(field, "").casefold() == value)
+        return sorted(hits)
+
+    def _do(self, action: str, params: dict[str, Any]) -> Any:
+        if action == "findNotes":
+            return self._find(params["query"])
+        if action == "notesInfo":
+            return [
+                {"noteId": nid, "fields": {k: {"value": v, "order": i} for i, (k, v) in enumerate(self.notes[nid].items())}}
+                for nid in params["notes"]
+                if nid in self.notes
+            ]
+        if action == "updateNoteFields":
+            note = params["note"]
+            if note["id"] not in self.notes:
+                raise KeyError(f"Note was not found: {note['id']}")
+            self.notes[note["id"]].update(note["fields"])
+            return None
+        if action == "version":
+            return 6
+        raise AssertionError(f"unexpected action {action}")
+
+    def __call__(self, action: str, params: dict[str, Any] | None = None, url: str = "") -> dict[str, Any]:
+        self.requests.append(action)
+        if action == "multi":
+            out = []
+            for sub in params["actions"]:
+                try:
+                    out.append({"result": self._do(sub["action"], sub.get("params") or {}), "error": None})
+                except KeyError as e:
+                    out.append({"result": None, "error": str(e)})
+            return {"result": out, "error": None}
+        return {"result": self._do(action, params or {}), "error": None}
+
+
+@pytest.fixture
+def fake_anki(monkeypatch):
+    fake = FakeAnki({1000 + i: {"NoteID": f"t-{i:03d}", "Front": "", "Back": ""} for i in range(5)})
+    monkeypatch.setattr(mod, "anki_request", fake)
+    return fake
+
+
+@pytest.fixture
+def anki_server():
+    """Local AnkiConnect stand-in that echoes the action as its result."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps({"result": payload["action"], "error": None}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# anki_request
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestAnkiRequest:
+    def test_round_trip(self, anki_server):
+        assert mod.anki_request("version", url=anki_server) == {"result": "version", "error": None}
+
+    def test_stdlib_json_fallback(self, anki_server, monkeypatch):
+        monkeypatch.setattr(mod, "orjson", None)
+        out = mod.anki_request("notesInfo", {"notes": [1], "q": "ї"}, url=anki_server)
+        assert out == {"result": "notesInfo", "error": None}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# anki_multi
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestAnkiMulti:
+    def test_batches_and_preserves_order(self, fake_anki, monkeypatch):
+        monkeypatch.setattr(mod, "MULTI_BATCH_SIZE", 2)
+        queries = [("findNotes", {"query": f'NoteID:"t-{i:03d}"'}) for i in (4, 0, 2, 9, 1)]
+
+        results = mod.anki_multi(queries)
+
+        assert results == [[1004], [1000], [1002], [], [1001]]
+        assert fake_anki.requests == ["multi", "multi", "multi"]
+
+    def test_sub_action_error_raises(self, fake_anki):
+        with pytest.raises(RuntimeError, match="1 of 2 sub-actions failed"):
+            mod.anki_multi(
+                [
+                    ("updateNoteFields", {"note": {"id": 1000, "fields": {"Back": "x"}}}),
+                    ("updateNoteFields", {"note": {"id": 42, "fields": {"Back": "x"}}}),
+                ]
+            )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# resolve_note_ids_from_note_id_field
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestResolveNoteIds:
+    def test_resolves_only_rows_missing_noteId_in_one_batch(self, fake_anki):
+        rows = [
+            {"note_id": "t-000", "noteId": ""},
+            {"note_id": "t-001", "noteId": "1001"},
+            {"note_id": "t-003", "noteId": ""},
+            {"note_id": "missing", "noteId": ""},
+            {"note_id": "", "noteId": ""},
+        ]
+
+        mapping = mod.resolve_note_ids_from_note_id_field(rows, anki_url="")
+
+        assert mapping == {"t-000": 1000, "t-003": 1003}
+        assert fake_anki.requests == ["findNotes", "notesInfo"]
+
+    def test_or_queries_are_chunked(self, fake_anki, monkeypatch):
+        monkeypatch.setattr(mod, "FIND_OR_BATCH_SIZE", 2)
+        rows = [{"note_id": f"t-{i:03d}", "noteId": ""} for i in range(5)]
+
+        mapping = mod.resolve_note_ids_from_note_id_field(rows, anki_url="")
+
+        assert mapping == {f"t-{i:03d}": 1000 + i for i in range(5)}
+        assert fake_anki.requests == ["findNotes", "notesInfo"] * 3
+
+    def test_duplicate_field_value_uses_first_note_and_warns(self, fake_anki, capsys):
+        fake_anki.notes[999] = {"NoteID": "T-002", "Front": "", "Back": ""}
+
+        mapping = mod.resolve_note_ids_from_note_id_field([{"note_id": "t-002", "noteId": ""}], anki_url="")
+
+        assert mapping == {"t-002": 999}
+        assert "multiple notes match" in capsys.readouterr().out
+
+    def test_nothing_to_resolve_sends_nothing(self, fake_anki):
+        assert mod.resolve_note_ids_from_note_id_field([{"note_id": "t-000", "noteId": "1000"}], anki_url="") == {}
+        assert fake_anki.requests == []
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# main
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestMain:
+    def test_front_back_updates_sent_in_one_multi(self, fake_anki, tmp_path, monkeypatch, capsys):
+        tsv = tmp_path / "in.tsv"
+        tsv.write_text(
+            "note_id\tnoteId\tfront_html\tback_html\tanswer_html\n"
+            "t-000\t\t<p>F0</p>\t<p>B0\\nmore</p>\t\n"
+            "t-001\t1001\t<p>F1</p>\t<p>B1</p>\t\n"
+            "nope\t\t<p>F</p>\t<p>B</p>\t\n",
+            encoding="utf-8",
+        )
+        monkeypatch.setattr(sys, "argv", ["update_notes_from_tsv.py", "--in", str(tsv)])
+
+        mod.main()
+
+        assert fake_anki.notes[1000] == {"NoteID": "t-000", "Front": "<p>F0</p>", "Back": "<p>B0\nmore</p>"}
+        assert fake_anki.notes[1001]["Back"] == "<p>B1</p>"
+        assert fake_anki.requests.count("updateNoteFields") == 0
+        assert fake_anki.requests[-1] == "multi"
+        assert "SKIP (no noteId and could not resolve): nope" in capsys.readouterr().out
@@ -28,6 +28,8 @@ except Exception as e:  # pragma: no cover
         "Missing dependency: PyYAML. Install with: pip install pyyaml"
     ) from e
 
+# libyaml's C loader when PyYAML was built with it: same results, ~10x faster.
+_SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 _FRONT_RE = re.compile(r"(?mi)^\s*#\s*front_md\s*$")
 _BACK_RE = re.compile(r"(?mi)^\s*#\s*back_md\s*$")
@@ -51,7 +53,7 @@ def _split_frontmatter(text: str, path: Path) -> tuple[dict[str, Any], str]:
         raise ValueError(f"{path}: malformed YAML front matter block.")
 
     yml, rest = m.group(1), m.group(2)
-    meta = yaml.safe_load(yml) or {}
+    meta = yaml.load(yml, Loader=_SafeLoader) or {}
     if not isinstance(meta, dict):
         raise ValueError(f"{path}: YAML front matter must be a mapping/object.")
     return meta, rest
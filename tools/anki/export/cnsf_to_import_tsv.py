@@ -8,14 +8,25 @@ from __future__ import annotations
 import argparse
 import csv
 import glob
+import hashlib
+import json
+import os
 import sys
+import tempfile
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 from tools.anki.cnsf_parse import load_cnsf_note
-from tools.anki.md_to_html_mmd import render_cnsf_note_to_html
+from tools.anki.md_to_html_mmd import render_cnsf_note_to_html, renderer_id
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[3] / ".anki-cache" / "render"
+
+# Buffer size for TSV reads/writes (Python's default is 8 KiB).
+IO_BUF = 1 << 20
 
 
 def load_export_profile(model: str) -> dict:
@@ -59,6 +70,13 @@ def resolve_profile_value(env: "CnsfEnvelope", key: str, rendered: dict[str, str
     return env.fields.get(key, "")
 
 
+def _non_negative_int(s: str) -> int:
+    n = int(s)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"must be >= 0, got {n}")
+    return n
+
+
 def eprint(*args: Any) -> None:
     print(*args, file=sys.stderr)
 
@@ -69,11 +87,24 @@ def _split_tags(tags: Any) -> List[str]:
     if isinstance(tags, list):
         return [str(t).strip() for t in tags if str(t).strip()]
     if isinstance(tags, str):
-        raw = tags.replace(",", " ").split()
-        return [t.strip() for t in raw if t.strip()]
+        # str.split() already drops empty tokens and surrounding whitespace.
+        if "," in tags:
+            return tags.replace(",", " ").split()
+        return tags.split()
     return [str(tags).strip()] if str(tags).strip() else []
 
 
+_TSV_ESCAPES = str.maketrans({"\t": "\\t", "\n": "\\n", "\r": "\\n"})
+
+
+def _tsv_safe(v: str) -> str:
+    # Keep each TSV record to ONE physical line.
+    # HTML can contain newlines/tabs; escape them (CRLF/CR count as one newline).
+    if "\r\n" in v:
+        v = v.replace("\r\n", "\n")
+    return v.translate(_TSV_ESCAPES)
+
+
 def _stable_extra_field_names(notes: List["CnsfEnvelope"]) -> List[str]:
     keys = set()
     for n in notes:
@@ -97,6 +128,9 @@ class CnsfEnvelope:
     deck: str
     tags: List[str]
     fields: Dict[str, str]
+    # Renderer input, kept so the render cache can be keyed without re-parsing.
+    front_md: str = ""
+    back_md: str = ""
 
 
 def load_envelope(path: Path, noteid_map: Dict[str, str] | None) -> CnsfEnvelope:
@@ -133,6 +167,8 @@ def load_envelope(path: Path, noteid_map: Dict[str, str] | None) -> CnsfEnvelope
         deck=deck,
         tags=tags,
         fields=fields_str,
+        front_md=note.front_md,
+        back_md=note.back_md,
     )
 
 
@@ -140,7 +176,7 @@ def read_noteid_map(map_path: Path) -> Dict[str, str]:
     m: Dict[str, str] = {}
     if not map_path.exists():
         return m
-    with map_path.open("r", encoding="utf-8", newline="") as f:
+    with map_path.open("r", encoding="utf-8", newline="", buffering=IO_BUF) as f:
         reader = csv.DictReader(f, delimiter="\t")
         for row in reader:
             nid = (row.get("note_id") or "").strip()
@@ -155,29 +191,134 @@ def _is_skipped(p: Path) -> bool:
     return p.name.startswith("_")
 
 
+def _file_key(st: os.stat_result) -> tuple[int, int]:
+    return (st.st_dev, st.st_ino)
+
+
+def _walk_md(root: str) -> Iterator[os.DirEntry]:
+    """Yield every *.md file entry under `root` (symlinked dirs are not followed)."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.name.endswith(".md") and e.is_file():
+                    yield e
+
+
 def expand_inputs(inputs: List[str]) -> List[Path]:
-    out: List[Path] = []
+    # (path, (st_dev, st_ino)) pairs; the inode key dedupes the same file
+    # reached via different spellings or symlinks.
+    out: List[tuple[Path, tuple[int, int]]] = []
     for inp in inputs:
         p = Path(inp)
         if p.is_dir():
-            out.extend(sorted(q for q in p.glob("**/*.md") if not _is_skipped(q)))
-        else:
-            matches = glob.glob(inp, recursive=True)
-            if matches:
-                out.extend(sorted(Path(x) for x in matches if not _is_skipped(Path(x))))
-            elif p.suffix == ".md" and p.exists() and not _is_skipped(p):
-                out.append(p)
+            entries = (e for e in _walk_md(inp) if not e.name.startswith("_"))
+            out.extend(sorted(((Path(e.path), _file_key(e.stat())) for e in entries), key=lambda t: t[0]))
+        elif p.exists():
+            # Checked before globbing so names like "note[1].md" stay literal.
+            if not _is_skipped(p):
+                out.append((p, _file_key(p.stat())))
+        elif any(c in inp for c in "*?["):
+            matches = sorted(Path(x) for x in glob.glob(inp, recursive=True))
+            out.extend((q, _file_key(q.stat())) for q in matches if not _is_skipped(q))
     seen = set()
     uniq = []
-    for p in out:
-        rp = str(p.resolve())
-        if rp not in seen:
+    for p, key in out:
+        if key not in seen:
             uniq.append(p)
-            seen.add(rp)
+            seen.add(key)
     return uniq
 
 
-def write_tsv(out_path: Path, notes: List[CnsfEnvelope], extra_field_names: List[str], overwrite: bool) -> None:
+@lru_cache(maxsize=1)
+def _renderer_id() -> str:
+    return renderer_id()
+
+
+def _source_key(env: CnsfEnvelope) -> str:
+    """
+    BLAKE2b digest of what the renderer actually reads: the front_md/back_md
+    bodies plus the renderer id. Front matter (note_id, tags, deck, ...) is
+    left out, so metadata edits keep their cache entry.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in (env.front_md, env.back_md, _renderer_id()):
+        h.update(part.encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def _cached_render(path: str, key: str, cache_dir: Path | None) -> Dict[str, str]:
+    """
+    Render one note, reusing HTML from `cache_dir` when the source is unchanged.
+
+    Entries live at <cache_dir>/<key[:2]>/<key>.json, keyed by _source_key().
+    Writes go to a temp file and are renamed into place, so concurrent or
+    interrupted runs never leave a half-written entry behind.
+    """
+    if cache_dir is None:
+        return render_cnsf_note_to_html(path)
+
+    entry = cache_dir / key[:2] / f"{key}.json"
+
+    try:
+        with entry.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    rendered = render_cnsf_note_to_html(path)
+
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(rendered, f, ensure_ascii=False)
+        os.replace(tmp, entry)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return rendered
+
+
+def _render_all(
+    notes: List[CnsfEnvelope], jobs: int = 0, cache_dir: Path | None = None
+) -> List[Dict[str, str]]:
+    """
+    Render every note's front/back HTML, returned in the same order as `notes`.
+
+    Notes with identical front_md/back_md are rendered once and share the result.
+    Rendering shells out to MultiMarkdown per note, so a thread pool overlaps the
+    subprocess waits. jobs=0 uses the executor default; jobs=1 renders serially
+    (handy when debugging a single bad note).
+    """
+    paths = [str(env.path) for env in notes]
+    keys = [_source_key(env) for env in notes]
+
+    unique: Dict[str, str] = {}  # key -> first path with that front/back
+    for k, p in zip(keys, paths):
+        unique.setdefault(k, p)
+
+    render = partial(_cached_render, cache_dir=cache_dir)
+    if jobs == 1 or len(unique) <= 1:
+        rendered = [render(p, k) for k, p in unique.items()]
+    else:
+        with ThreadPoolExecutor(max_workers=jobs or None) as ex:
+            rendered = list(ex.map(render, unique.values(), unique.keys()))
+
+    by_key = dict(zip(unique.keys(), rendered))
+    return [by_key[k] for k in keys]
+
+
+def write_tsv(
+    out_path: Path,
+    notes: List[CnsfEnvelope],
+    extra_field_names: List[str],
+    overwrite: bool,
+    jobs: int = 0,
+    cache_dir: Path | None = None,
+) -> None:
     if out_path.exists() and not overwrite:
         raise FileExistsError(f"Refusing to overwrite existing file: {out_path}")
 
@@ -185,40 +326,33 @@ def write_tsv(out_path: Path, notes: List[CnsfEnvelope], extra_field_names: List
 
     # Build header from the union of all model profiles present in the notes,
     # preserving first-seen order so each model's columns are contiguous.
-    seen_models: set[str] = set()
+    profiles: Dict[str, dict] = {}
     all_profile_fields: list[str] = []
     for env in notes:
-        if env.model not in seen_models:
-            seen_models.add(env.model)
-            _p = load_export_profile(env.model)
-            for k in _p["fields"].keys():
+        if env.model not in profiles:
+            profiles[env.model] = load_export_profile(env.model)
+            for k in profiles[env.model]["fields"].keys():
                 if k not in all_profile_fields:
                     all_profile_fields.append(k)
     header = ["model", "deck"] + all_profile_fields
 
-    with out_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=header, delimiter="\t", quoting=csv.QUOTE_MINIMAL,
-                           restval="")
-        w.writeheader()
-
-        def _tsv_safe(v: str) -> str:
-            # Keep each TSV record to ONE physical line.
-            # HTML can contain newlines/tabs; escape them.
-            v = v.replace("\r\n", "\n").replace("\r", "\n")
-            v = v.replace("\t", "\\t").replace("\n", "\\n")
-            return v
-
-        for env in notes:
-            profile = load_export_profile(env.model)
-            rendered = render_cnsf_note_to_html(str(env.path))
-            row = {
-                "model": env.model,
-                "deck": env.deck,
-            }
-            for anki_field, source in profile["fields"].items():
-                val = resolve_profile_value(env, source, rendered)
-                val = _tsv_safe(val)
-                row[anki_field] = val
+    # Per model, the profile source feeding each header column (None = not in
+    # this model's profile, written as an empty cell).
+    columns = {
+        model: [p["fields"].get(k) for k in all_profile_fields]
+        for model, p in profiles.items()
+    }
+
+    with out_path.open("w", encoding="utf-8", newline="", buffering=IO_BUF) as f:
+        w = csv.writer(f, delimiter="\t", quoting=csv.QUOTE_MINIMAL)
+        w.writerow(header)
+
+        for env, rendered in zip(notes, _render_all(notes, jobs, cache_dir)):
+            row = [env.model, env.deck]
+            row.extend(
+                "" if source is None else _tsv_safe(resolve_profile_value(env, source, rendered))
+                for source in columns[env.model]
+            )
             w.writerow(row)
 
 def main() -> int:
@@ -228,6 +362,12 @@ def main() -> int:
     ap.add_argument("--map", default="")
     ap.add_argument("--overwrite", action="store_true")
     ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--jobs", type=_non_negative_int, default=0,
+                    help="Parallel render workers (0 = auto, 1 = serial for debugging)")
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                    help=f"Rendered-HTML cache directory (default: {DEFAULT_CACHE_DIR})")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Always re-render; neither read nor write the HTML cache")
     args = ap.parse_args()
 
     paths = expand_inputs(args.inputs)
@@ -247,7 +387,9 @@ def main() -> int:
     envs.sort(key=lambda x: x.note_id)
     extra_field_names = _stable_extra_field_names(envs)
 
-    write_tsv(Path(args.out), envs, extra_field_names, args.overwrite)
+    cache_dir = None if args.no_cache else Path(args.cache_dir)
+    write_tsv(Path(args.out), envs, extra_field_names, args.overwrite,
+              jobs=args.jobs, cache_dir=cache_dir)
 
     print(f"Rows: {len(envs)}")
     print(f"Output: {args.out}")
@@ -3,17 +3,27 @@ from __future__ import annotations
 
 import argparse
 import html
+import mmap
+import os
 import re
+from contextlib import contextmanager
 from pathlib import Path
+from typing import IO, Iterator
 
-# Matches: <h2 id="sys-elec-psc-010">sys-elec-psc-010</h2>
-H2_RE = re.compile(r"<h2\b[^>]*>(?P<text>.*?)</h2>", re.IGNORECASE)
-
-# AFTER header: <h3 id="after">AFTER</h3> (MultiMarkdown lowercases id)
-AFTER_H3_RE = re.compile(r"<h3\b[^>]*>\s*AFTER\s*</h3>", re.IGNORECASE)
+# One pass over every <h2>/<h3> heading, in document order:
+#   <h2 id="sys-elec-psc-010">sys-elec-psc-010</h2>   (note boundary)
+#   <h3 id="after">AFTER</h3>                          (MultiMarkdown lowercases id)
+# (byte patterns: the input is memory-mapped and only captured spans are decoded)
+HEADING_RE = re.compile(rb"(?is)<(h2|h3)\b[^>]*>(.*?)</\1>")
 
 # Stop collecting at next <hr />, or next <h2>, or end
-STOP_RE = re.compile(r"(<hr\s*/?>|<h2\b)", re.IGNORECASE)
+STOP_RE = re.compile(rb"(<hr\s*/?>|<h2\b)", re.IGNORECASE)
+
+TAG_RE = re.compile(r"<[^>]+>")
+WS_RE = re.compile(r"\s+")
+
+# Buffer size for TSV reads/writes (Python's default is 8 KiB).
+IO_BUF = 1 << 20
 
 def tsv_escape_cell(s: str) -> str:
     # keep one-row-per-record TSV
@@ -26,35 +36,57 @@ def strip_outer_ws(s: str) -> str:
     # preserve internal newlines; trim ends
     return s.strip()
 
-def find_notes(html_text: str) -> list[tuple[str, str]]:
-    out: list[tuple[str, str]] = []
-
-    # Find all <h2> sections and slice between them
-    matches = list(H2_RE.finditer(html_text))
-    for idx, m in enumerate(matches):
-        note_id = html.unescape(m.group("text")).strip()
-        start = m.end()
-        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(html_text)
-        section = html_text[start:end]
-
-        # Find AFTER marker
-        m_after = AFTER_H3_RE.search(section)
-        if not m_after:
+# map_html/atomic_open are duplicated in html_frontback_to_tsv.py on purpose:
+# both scripts are run as plain files (pipeline.py, docs), so they share no module.
+@contextmanager
+def map_html(path: Path) -> Iterator[bytes]:
+    # Read-only mmap: regexes scan the page cache, no decoded copy of the file
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap rejects empty files
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm  # type: ignore[misc]
+
+@contextmanager
+def atomic_open(path: Path, **kwargs) -> Iterator[IO[str]]:
+    # Write to a temp file next to `path` and rename it into place only on
+    # success, so a failed run (find_notes decodes strictly, so bad UTF-8
+    # raises) leaves any existing output untouched.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("w", **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def heading_text(s: str) -> str:
+    # Plain text of a heading's inner HTML: drop inline tags, decode every
+    # entity (named and numeric), collapse whitespace.
+    return html.unescape(WS_RE.sub(" ", TAG_RE.sub("", s))).strip()
+
+def find_notes(html_bytes: bytes) -> Iterator[tuple[str, str]]:
+    # Yields (note_id, after_html) as found, so callers can stream rows out.
+    # Walk the headings once; the first AFTER <h3> under each <h2> opens that
+    # note's region, which runs to the next <hr> or <h2>.
+    note_id: str | None = None
+    for m in HEADING_RE.finditer(html_bytes):
+        text = heading_text(m.group(2).decode("utf-8"))
+        if m.group(1).lower() == b"h2":
+            note_id = text
+            continue
+        if note_id is None or text.upper() != "AFTER":
             continue
 
-        after_start = m_after.end()
-        after_region = section[after_start:]
-
-        # Stop at <hr> or next <h2> if present inside slice
-        m_stop = STOP_RE.search(after_region)
-        if m_stop:
-            after_region = after_region[: m_stop.start()]
-
-        after_html = strip_outer_ws(after_region)
+        after_start = m.end()
+        m_stop = STOP_RE.search(html_bytes, after_start)
+        after_end = m_stop.start() if m_stop else len(html_bytes)
+        after_html = strip_outer_ws(html_bytes[after_start:after_end].decode("utf-8"))
         if after_html:
-            out.append((note_id, after_html))
-
-    return out
+            yield (note_id, after_html)
+        note_id = None
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Extract AFTER sections from canonical HTML to TSV.")
@@ -65,17 +97,15 @@ def main() -> None:
     inp = Path(args.inp)
     outp = Path(args.outp)
 
-    html_text = inp.read_text(encoding="utf-8")
-    notes = find_notes(html_text)
-
-    lines = ["note_id\tafter_html"]
-    for note_id, after_html in notes:
-        lines.append(f"{tsv_escape_cell(note_id)}\t{tsv_escape_cell(after_html)}")
-
     outp.parent.mkdir(parents=True, exist_ok=True)
-    outp.write_text("\n".join(lines) + "\n", encoding="utf-8")
-
-    print(f"Rows: {len(notes)}")
+    n_rows = 0
+    with map_html(inp) as html_bytes, atomic_open(outp, encoding="utf-8", buffering=IO_BUF) as f:
+        f.write("note_id\tafter_html\n")
+        for note_id, after_html in find_notes(html_bytes):
+            f.write(f"{tsv_escape_cell(note_id)}\t{tsv_escape_cell(after_html)}\n")
+            n_rows += 1
+
+    print(f"Rows: {n_rows}")
     print(f"Output: {outp}")
 
 if __name__ == "__main__":
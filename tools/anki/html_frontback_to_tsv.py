@@ -17,24 +17,40 @@ from __future__ import annotations
 
 import argparse
 import csv
+import mmap
+import os
 import re
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Tuple
-
-
-H2_RE = re.compile(
-    r'(?is)<h2\b[^>]*\bid="(?P<id>[^"]+)"[^>]*>.*?</h2>(?P<body>.*?)(?=(<h2\b[^>]*\bid=")|\Z)'
+from typing import IO, Dict, Iterator, Tuple
+
+
+# Byte patterns: the input is memory-mapped and only captured spans are decoded.
+# A note section runs from its <h2 id="NOTE_ID">...</h2> to the next such
+# opening tag (or EOF); sections are sliced between successive open-tag matches.
+H2_OPEN_RE  = re.compile(rb'(?is)<h2\b[^>]*\bid="(?P<id>[^"]+)"[^>]*>')
+H2_CLOSE_RE = re.compile(rb'(?i)</h2>')
+
+# One anchored match splits a section into front/back:
+#   [anything] <h3>AFTER_FRONT</h3>   optional; front starts after it (else at 0)
+#   front ... <h3>AFTER_BACK</h3>     front ends at the first AFTER_BACK (else EOF)
+#   back ... <hr>                     back ends at the first <hr> (else EOF)
+# The <h3> ids may repeat across notes; we do NOT rely on them.
+SECTION_RE = re.compile(
+    rb'(?is)\A(?:.*?(?P<front_marker><h3\b[^>]*>\s*AFTER_FRONT\s*</h3>))?'
+    rb'(?P<front>.*?)'
+    rb'(?:<h3\b[^>]*>\s*AFTER_BACK\s*</h3>(?P<back>.*?)(?:<hr\b[^>]*/?>|\Z)|\Z)'
 )
 
-# Match an <h3 ...>AFTER_FRONT</h3> (id may repeat; we do NOT rely on it)
-AFTER_FRONT_RE = re.compile(r'(?is)<h3\b[^>]*>\s*AFTER_FRONT\s*</h3>')
-AFTER_BACK_RE  = re.compile(r'(?is)<h3\b[^>]*>\s*AFTER_BACK\s*</h3>')
-HR_RE          = re.compile(r'(?is)<hr\b[^>]*/?>')
+HEADER = ["note_id", "noteId", "front_html", "back_html", "answer_html"]
+
+# Buffer size for TSV reads/writes (Python's default is 8 KiB).
+IO_BUF = 1 << 20
 
 
 def load_noteid_map(map_tsv: Path) -> Dict[str, str]:
     m: Dict[str, str] = {}
-    with map_tsv.open("r", encoding="utf-8", newline="") as f:
+    with map_tsv.open("r", encoding="utf-8", newline="", buffering=IO_BUF) as f:
         rdr = csv.DictReader(f, delimiter="\t")
         if not rdr.fieldnames:
             return m
@@ -49,31 +65,65 @@ def load_noteid_map(map_tsv: Path) -> Dict[str, str]:
     return m
 
 
-def extract_front_back(section_html: str) -> Tuple[str, str]:
+def _decode(b: bytes) -> str:
+    return b.decode("utf-8", errors="replace")
+
+
+# map_html/atomic_open are duplicated in html_after_to_tsv.py on purpose: both
+# scripts are run as plain files (pipeline.py, docs), so they share no module.
+@contextmanager
+def map_html(path: Path) -> Iterator[bytes]:
     """
-    Given the HTML content *within* a note's h2 section, return (front_html, back_html).
+    Yield the file's bytes via a read-only mmap, so the regexes scan the page
+    cache directly instead of a read + decoded copy of the whole file.
     """
-    m_front = AFTER_FRONT_RE.search(section_html)
-    m_back  = AFTER_BACK_RE.search(section_html)
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap rejects empty files
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm  # type: ignore[misc]
+
+
+@contextmanager
+def atomic_open(path: Path, **kwargs) -> Iterator[IO[str]]:
+    # Write to a temp file next to `path` and rename it into place only on
+    # success, so a run that dies part-way (an exception from
+    # extract_front_back, a write error) leaves any existing output untouched.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("w", **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def iter_sections(html: bytes) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (note_id, body) for each <h2 id="..."> section, in document order.
+    body is the HTML after the heading's </h2>, up to the next section.
+    """
+    opens = list(H2_OPEN_RE.finditer(html))
+    for i, m in enumerate(opens):
+        end = opens[i + 1].start() if i + 1 < len(opens) else len(html)
+        m_close = H2_CLOSE_RE.search(html, m.end(), end)
+        if not m_close:
+            continue
+        yield _decode(m.group("id")).strip(), html[m_close.end():end]
 
-    if not m_front and not m_back:
+
+def extract_front_back(section_html: bytes) -> Tuple[str, str]:
+    """
+    Given the HTML content *within* a note's h2 section, return (front_html, back_html).
+    """
+    m = SECTION_RE.match(section_html)
+    if m is None or (m.group("front_marker") is None and m.group("back") is None):
         # Nothing to split
         return ("", "")
 
-    # If AFTER_FRONT exists: start after it; otherwise start at beginning
-    start_front = m_front.end() if m_front else 0
-
-    if m_back:
-        front_chunk = section_html[start_front:m_back.start()]
-        start_back = m_back.end()
-        # back until first <hr> (end-of-note marker) or end
-        m_hr = HR_RE.search(section_html, pos=start_back)
-        back_chunk = section_html[start_back:(m_hr.start() if m_hr else len(section_html))]
-    else:
-        front_chunk = section_html[start_front:]
-        back_chunk = ""
-
-    return (front_chunk.strip(), back_chunk.strip())
+    return (_decode(m.group("front")).strip(), _decode(m.group("back") or b"").strip())
 
 
 def main() -> None:
@@ -87,48 +137,31 @@ def main() -> None:
     out = Path(args.out)
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    html = inp.read_text(encoding="utf-8", errors="replace")
-
     noteid_map: Dict[str, str] = {}
     if args.map_tsv:
         noteid_map = load_noteid_map(Path(args.map_tsv))
 
-    rows: List[Dict[str, str]] = []
+    # Rows are written as each section is extracted; nothing is accumulated.
+    n_rows = 0
+    with map_html(inp) as html, atomic_open(out, encoding="utf-8", newline="", buffering=IO_BUF) as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(HEADER)
 
-    for m in H2_RE.finditer(html):
-        note_id = (m.group("id") or "").strip()
-        body = m.group("body") or ""
-        if not note_id:
-            continue
+        for note_id, body in iter_sections(html):
+            if not note_id:
+                continue
+
+            front_html, back_html = extract_front_back(body)
+
+            # Compatibility: answer_html defaults to back_html; if missing, use whatever exists
+            answer_html = back_html or front_html or _decode(body).strip()
+
+            noteId = noteid_map.get(note_id, "")
+
+            w.writerow((note_id, noteId, front_html, back_html, answer_html))
+            n_rows += 1
 
-        front_html, back_html = extract_front_back(body)
-
-        # Compatibility: answer_html defaults to back_html; if missing, use whatever exists
-        answer_html = back_html or front_html or body.strip()
-
-        noteId = noteid_map.get(note_id, "")
-
-        rows.append(
-            {
-                "note_id": note_id,
-                "noteId": noteId,
-                "front_html": front_html,
-                "back_html": back_html,
-                "answer_html": answer_html,
-            }
-        )
-
-    with out.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(
-            f,
-            fieldnames=["note_id", "noteId", "front_html", "back_html", "answer_html"],
-            delimiter="\t",
-        )
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-
-    print(f"Rows: {len(rows)}")
+    print(f"Rows: {n_rows}")
     print(f"Output: {out}")
 
 
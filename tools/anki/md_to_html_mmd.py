@@ -21,6 +21,10 @@ from typing import Any
 
 from tools.anki.cnsf_parse import load_cnsf_note
 
+# Bump whenever a change here alters rendered output, so HTML cached by
+# cnsf_to_import_tsv (keyed on renderer_id()) is invalidated.
+RENDERER_VERSION = "1"
+
 
 def _run(cmd: list[str], inp: str | None = None) -> subprocess.CompletedProcess[str]:
     return subprocess.run(
@@ -140,3 +144,12 @@ def render_cnsf_note_to_html(note_path: str | Path) -> dict[str, str]:
         "front_provenance": front_prov,
         "back_provenance": back_prov,
     }
+
+
+def renderer_id() -> str:
+    """
+    Identify the renderer for cache keys: RENDERER_VERSION plus the
+    MultiMarkdown version line (an mmd upgrade can change output too).
+    """
+    mmd_cmd = _find_mmd()
+    return f"{RENDERER_VERSION}:{_mmd_version(mmd_cmd) if mmd_cmd else 'no-mmd'}"
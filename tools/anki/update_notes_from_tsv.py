@@ -9,9 +9,23 @@ import urllib.request
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson  # optional: faster JSON encode/decode for large notesInfo/multi payloads
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
 
 DEFAULT_ANKI_URL = "http://127.0.0.1:8765"
 
+# Buffer size for TSV reads/writes (Python's default is 8 KiB).
+IO_BUF = 1 << 20
+
+# Sub-actions per AnkiConnect "multi" request.
+MULTI_BATCH_SIZE = 200
+
+# note_id terms per OR-joined findNotes query when resolving noteIds.
+FIND_OR_BATCH_SIZE = 100
+
 CANDIDATE_ANSWER_FIELDS = [
     # most common
     "Answer",
@@ -28,16 +42,28 @@ CANDIDATE_ANSWER_FIELDS = [
 ]
 
 
+def _json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _json_loads(raw: bytes) -> Any:
+    # Both parsers take UTF-8 bytes directly; no intermediate str.
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
 def anki_request(action: str, params: dict[str, Any] | None = None, url: str = DEFAULT_ANKI_URL) -> dict[str, Any]:
     payload: dict[str, Any] = {"action": action, "version": 6}
     if params is not None:
         payload["params"] = params
 
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    req = urllib.request.Request(url, data=_json_dumps(payload), headers={"Content-Type": "application/json"})
     with urllib.request.urlopen(req, timeout=30) as resp:
-        raw = resp.read().decode("utf-8")
-    out = json.loads(raw)
+        raw = resp.read()
+    out = _json_loads(raw)
 
     if "error" not in out or "result" not in out:
         raise RuntimeError(f"Unexpected AnkiConnect response: {out}")
@@ -46,14 +72,47 @@ def anki_request(action: str, params: dict[str, Any] | None = None, url: str = D
     return out
 
 
+def anki_multi(
+    actions: list[tuple[str, dict[str, Any]]], url: str = DEFAULT_ANKI_URL
+) -> list[Any]:
+    """
+    Run (action, params) pairs through AnkiConnect's "multi" action, in batches
+    of MULTI_BATCH_SIZE, and return each sub-action's result in order.
+
+    Raises RuntimeError if any sub-action reports an error (after its batch has
+    been sent, so earlier sub-actions in that batch may already have applied).
+    """
+    results: list[Any] = []
+    for i in range(0, len(actions), MULTI_BATCH_SIZE):
+        batch = actions[i : i + MULTI_BATCH_SIZE]
+        sub = [{"action": a, "version": 6, "params": p} for a, p in batch]
+        out = anki_request("multi", {"actions": sub}, url=url)["result"] or []
+        if len(out) != len(batch):
+            raise RuntimeError(f"AnkiConnect multi returned {len(out)} results for {len(batch)} actions")
+
+        errors = [
+            f"{a}: {r['error']}"
+            for (a, _), r in zip(batch, out)
+            if isinstance(r, dict) and r.get("error") is not None
+        ]
+        if errors:
+            raise RuntimeError(
+                f"AnkiConnect multi: {len(errors)} of {len(batch)} sub-actions failed; first: {errors[0]}"
+            )
+        results.extend(r["result"] if isinstance(r, dict) and "result" in r else r for r in out)
+    return results
+
+
 def _nl(s: str) -> str:
-    # TSVs sometimes store literal "\n" sequences
-    return (s or "").replace("\\n", "\n")
+    # TSVs sometimes store literal "\n" sequences; skip the copy when there are none
+    if s and "\\n" in s:
+        return s.replace("\\n", "\n")
+    return s or ""
 
 
 def read_import_html_tsv(path: Path) -> list[dict[str, str]]:
     rows: list[dict[str, str]] = []
-    with path.open("r", encoding="utf-8", newline="") as f:
+    with path.open("r", encoding="utf-8", newline="", buffering=IO_BUF) as f:
         rdr = csv.DictReader(f, delimiter="\t")
 
         # Minimal required identity columns
@@ -116,25 +175,47 @@ def resolve_note_ids_from_note_id_field(
     """
     mapping: dict[str, int] = {}
 
+    pending: list[str] = []
     for r in rows:
         note_id = (r.get("note_id") or "").strip()
         noteId_s = (r.get("noteId") or "").strip()
 
         if not note_id or noteId_s:
             continue
+        pending.append(note_id)
+    pending = list(dict.fromkeys(pending))
+
+    # Resolve a batch per round-trip pair: one OR-joined findNotes, then one
+    # notesInfo to map each hit back to the note_id stored in its field.
+    for i in range(0, len(pending), FIND_OR_BATCH_SIZE):
+        batch = pending[i : i + FIND_OR_BATCH_SIZE]
 
         # Exact match query on the NoteID field
         # Quote value to handle punctuation safely.
-        query = f'{note_id_field}:"{note_id}"'
+        query = " OR ".join(f'{note_id_field}:"{note_id}"' for note_id in batch)
         found = anki_request("findNotes", {"query": query}, url=anki_url)["result"] or []
-
         if not found:
             continue
 
-        if len(found) > 1:
-            print(f"WARNING: multiple notes match {query!r}; using first: {found[0]}")
+        info = anki_request("notesInfo", {"notes": found}, url=anki_url)["result"] or []
+
+        # Anki field search is case-insensitive; match values the same way.
+        hits: dict[str, list[int]] = {}
+        for n in info:
+            if not n or "noteId" not in n:
+                continue
+            value = ((n.get("fields") or {}).get(note_id_field) or {}).get("value", "")
+            hits.setdefault(value.strip().casefold(), []).append(int(n["noteId"]))
+
+        for note_id in batch:
+            ids = hits.get(note_id.casefold())
+            if not ids:
+                continue
+
+            if len(ids) > 1:
+                print(f'WARNING: multiple notes match {note_id_field}:"{note_id}"; using first: {ids[0]}')
 
-        mapping[note_id] = int(found[0])
+            mapping[note_id] = ids[0]
 
     return mapping
 
@@ -316,8 +397,7 @@ def main() -> None:
         print("Nothing to update.")
         return
 
-    for note in updates:
-        anki_request("updateNoteFields", {"note": note}, url=args.anki_url)
+    anki_multi([("updateNoteFields", {"note": note}) for note in updates], url=args.anki_url)
 
     print("✅ updateNoteFields complete (no error).")
 